@@ -21,7 +21,7 @@ import copy
 import os
 import subprocess
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 
 import boto3
 from covalent._shared_files import logger
@@ -31,6 +31,9 @@ from covalent_ssh_plugin.ssh import _EXECUTOR_PLUGIN_DEFAULTS as _SSH_EXECUTOR_P
 from covalent_ssh_plugin.ssh import SSHExecutor
 from pydantic import BaseModel
 
+from . import sampler
+from .profiling import ResourceProfile, build_profile, parse_samples
+
 executor_plugin_name = "EC2Executor"
 
 app_log = logger.app_log
@@ -102,6 +105,9 @@ class EC2Executor(SSHExecutor, AWSExecutor):
         do_cleanup: Whether to delete all the intermediate files or not
         covalent_version_to_install: Which version of covalent to be installed on the EC2 instance. Default: "==0.220.0.post2",
             it can also include the extras if needed as "[qiskit, braket]==0.220.0.post2"
+        profile_resources: Whether to sample CPU, memory, disk and network usage on the instance while the task
+            runs and write a right-sizing report to the cache directory. Default: False
+        profile_interval: Number of seconds between resource samples when profiling. Default: 1.0
     """
 
     _TF_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "assets", "infra"))
@@ -127,6 +133,8 @@ class EC2Executor(SSHExecutor, AWSExecutor):
         poll_freq: int = 15,
         do_cleanup: bool = True,
         covalent_version_to_install: str = "",  # Current stable version
+        profile_resources: bool = False,
+        profile_interval: float = 1.0,
     ) -> None:
 
         username = username or get_config("executors.ec2.username")
@@ -171,6 +179,15 @@ class EC2Executor(SSHExecutor, AWSExecutor):
         # Setting covalent version to be used in the EC2 instance
         self.covalent_version = covalent_version_to_install
 
+        if profile_interval <= 0:
+            raise ValueError(f"profile_interval must be positive, got {profile_interval}")
+
+        self.profile_resources = profile_resources
+        self.profile_interval = profile_interval
+        self.resource_samples = None
+        self.resource_profile = None
+        self._remote_run_failed = False
+
     async def _run_async_subprocess(self, cmd: List[str], cwd=None, log_output: bool = False):
 
         proc = await asyncio.create_subprocess_shell(
@@ -323,3 +340,124 @@ class EC2Executor(SSHExecutor, AWSExecutor):
         # Delete the state file
         os.remove(state_file)
         os.remove(f"{state_file}.backup")
+
+    def _get_sampler_paths(self, remote_script_file: str) -> Tuple[str, str]:
+        base = os.path.splitext(remote_script_file)[0]
+        return f"{base}_sampler.py", f"{base}_resources.jsonl"
+
+    async def _start_sampler(self, conn, remote_script_file: str) -> bool:
+        """
+        Uploads the resource sampler next to the remote script and starts it in the background
+        """
+        sampler_file, samples_file = self._get_sampler_paths(remote_script_file)
+
+        upload = await conn.run(f"cat > {sampler_file}", input=Path(sampler.__file__).read_text())
+        if upload.exit_status != 0:
+            app_log.warning(f"Could not upload resource sampler: {upload.stderr.strip()}")
+            return False
+
+        cmd = (
+            f"nohup {self.python_path} {sampler_file} "
+            f"--output {samples_file} --interval {self.profile_interval}"
+        )
+        if self.conda_env:
+            cmd = f'eval "$(conda shell.bash hook)" && conda activate {self.conda_env} && {cmd}'
+        cmd = f"({cmd}) > /dev/null 2>&1 &"
+
+        app_log.debug(f"Starting resource sampler on remote with command: {cmd}")
+        result = await conn.run(cmd)
+        if result.exit_status != 0:
+            app_log.warning(f"Could not start resource sampler: {result.stderr.strip()}")
+            return False
+
+        return True
+
+    async def _stop_sampler(self, conn, remote_script_file: str) -> List[Dict]:
+        """
+        Stops the resource sampler and returns the samples it collected
+        """
+        sampler_file, samples_file = self._get_sampler_paths(remote_script_file)
+
+        # The bracket keeps the pattern from matching the shell running these commands
+        pattern = f"'{sampler_file} --outpu[t]'"
+        await conn.run(f"pkill -TERM -f {pattern}")
+        # Give the sampler time to write its final sample and exit before reading the samples
+        await conn.run(
+            f"for i in $(seq 50); do pgrep -f {pattern} > /dev/null || break; sleep 0.1; done"
+        )
+        result = await conn.run(f"cat {samples_file}")
+        await conn.run(f"rm -f {sampler_file} {samples_file}")
+
+        return parse_samples(result.stdout or "")
+
+    async def submit_task(self, conn, remote_script_file: str):
+        """
+        Submits the task for execution, sampling the instance's resource usage while it runs if
+        profiling is enabled
+        """
+        if not self.profile_resources:
+            return await super().submit_task(conn, remote_script_file)
+
+        sampler_started = await self._start_sampler(conn, remote_script_file)
+        try:
+            return await super().submit_task(conn, remote_script_file)
+        finally:
+            if sampler_started:
+                try:
+                    self.resource_samples = await self._stop_sampler(conn, remote_script_file)
+                except Exception as e:
+                    app_log.warning(f"Could not collect resource samples: {e}")
+
+    def _write_resource_profile(self, task_metadata: Dict) -> Optional[ResourceProfile]:
+        """
+        Builds the right-sizing report from the collected samples and saves it to the cache dir
+        """
+        profile = build_profile(
+            self.resource_samples, self.instance_type, self.volume_size, task_metadata
+        )
+        if profile is None:
+            app_log.warning(
+                f"No resource samples collected for node {task_metadata['node_id']}, "
+                f"the task may have finished in less than {self.profile_interval} seconds"
+            )
+            return None
+
+        Path(self.cache_dir).mkdir(parents=True, exist_ok=True)
+        profile_file = os.path.join(
+            self.cache_dir,
+            f"resource_profile_{task_metadata['dispatch_id']}_{task_metadata['node_id']}.json",
+        )
+        with open(profile_file, "w") as f:
+            f.write(profile.to_json())
+
+        app_log.info(
+            f"Node {profile.node_id} on {profile.instance_type} was {profile.bottleneck}: "
+            f"recommended instance_type={profile.recommended_instance_type}, "
+            f"volume_size={profile.recommended_volume_size}. Report written to {profile_file}"
+        )
+        return profile
+
+    def _on_ssh_fail(self, fn: Callable, args: list, kwargs: dict, message: str):
+        self._remote_run_failed = True
+        return super()._on_ssh_fail(fn, args, kwargs, message)
+
+    async def run(self, function: Callable, args: list, kwargs: dict, task_metadata: Dict):
+        """
+        Runs the function on the instance and, if profiling is enabled, writes its resource profile
+        """
+        self.resource_samples = None
+        self._remote_run_failed = False
+        try:
+            return await super().run(function, args, kwargs, task_metadata)
+        finally:
+            # Only report on completed remote runs, the profile is optional and must never
+            # change the outcome of the task
+            if (
+                self.profile_resources
+                and self.resource_samples is not None
+                and not self._remote_run_failed
+            ):
+                try:
+                    self.resource_profile = self._write_resource_profile(task_metadata)
+                except Exception as e:
+                    app_log.warning(f"Could not write resource profile: {e}")
@@ -0,0 +1,321 @@
+# Copyright 2021 Agnostiq Inc.
+#
+# This file is part of Covalent.
+#
+# Licensed under the Apache License 2.0 (the "License"). A copy of the
+# License may be obtained with this software package or at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Use of this file is prohibited except in compliance with the License.
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Resource utilization reports and right-sizing recommendations for EC2 electrons."""
+
+import json
+import math
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, NamedTuple, Optional
+
+GIB = 1024**3
+
+
+class InstanceSize(NamedTuple):
+    name: str
+    vcpus: int
+    memory_gib: float
+
+
+def _sizes(*specs) -> List[InstanceSize]:
+    return [InstanceSize(*spec) for spec in specs]
+
+
+_BURSTABLE_2_VCPU_SIZES = _sizes(
+    ("nano", 2, 0.5),
+    ("micro", 2, 1),
+    ("small", 2, 2),
+    ("medium", 2, 4),
+    ("large", 2, 8),
+    ("xlarge", 4, 16),
+    ("2xlarge", 8, 32),
+)
+
+# Sizes of the instance families the executor is commonly used with, ordered from smallest
+INSTANCE_FAMILY_SIZES = {
+    "t2": _sizes(
+        ("nano", 1, 0.5),
+        ("micro", 1, 1),
+        ("small", 1, 2),
+        ("medium", 2, 4),
+        ("large", 2, 8),
+        ("xlarge", 4, 16),
+        ("2xlarge", 8, 32),
+    ),
+    "t3": _BURSTABLE_2_VCPU_SIZES,
+    "t3a": _BURSTABLE_2_VCPU_SIZES,
+    "m5": _sizes(
+        ("large", 2, 8),
+        ("xlarge", 4, 16),
+        ("2xlarge", 8, 32),
+        ("4xlarge", 16, 64),
+        ("8xlarge", 32, 128),
+        ("12xlarge", 48, 192),
+        ("16xlarge", 64, 256),
+        ("24xlarge", 96, 384),
+    ),
+    "c5": _sizes(
+        ("large", 2, 4),
+        ("xlarge", 4, 8),
+        ("2xlarge", 8, 16),
+        ("4xlarge", 16, 32),
+        ("9xlarge", 36, 72),
+        ("12xlarge", 48, 96),
+        ("18xlarge", 72, 144),
+        ("24xlarge", 96, 192),
+    ),
+    "r5": _sizes(
+        ("large", 2, 16),
+        ("xlarge", 4, 32),
+        ("2xlarge", 8, 64),
+        ("4xlarge", 16, 128),
+        ("8xlarge", 32, 256),
+        ("12xlarge", 48, 384),
+        ("16xlarge", 64, 512),
+        ("24xlarge", 96, 768),
+    ),
+}
+
+MIN_VOLUME_SIZE = 8
+
+CPU_BOUND_PERCENT = 90.0
+CPU_IDLE_PERCENT = 25.0
+MEMORY_BOUND_PERCENT = 85.0
+MEMORY_IDLE_PERCENT = 40.0
+IOWAIT_BOUND_PERCENT = 20.0
+DISK_FULL_PERCENT = 85.0
+DISK_EMPTY_PERCENT = 25.0
+
+# Baseline IOPS of the gp2 root volume provisioned for the instance
+GP2_IOPS_PER_GB = 3
+GP2_MIN_IOPS = 100
+
+
+@dataclass
+class ResourceProfile:
+    """Summary of the resources used by a single electron and the recommended spec."""
+
+    dispatch_id: str
+    node_id: int
+    instance_type: str
+    volume_size: int
+    duration: float
+    cpu_mean_percent: float
+    cpu_p95_percent: float
+    cpu_core_p95_percent: float
+    iowait_mean_percent: float
+    memory_peak_percent: float
+    disk_peak_percent: float
+    disk_read_peak_bps: float
+    disk_write_peak_bps: float
+    net_rx_peak_bps: float
+    net_tx_peak_bps: float
+    bottleneck: str
+    recommended_instance_type: str
+    recommended_volume_size: int
+    reasons: List[str] = field(default_factory=list)
+    samples: List[Dict] = field(default_factory=list)
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), indent=2)
+
+
+def parse_samples(raw: str) -> List[Dict]:
+    """Parse the JSON lines written by the sampler, skipping any truncated line."""
+    samples = []
+    for line in raw.splitlines():
+        try:
+            samples.append(json.loads(line))
+        except ValueError:
+            continue
+    return samples
+
+
+def compact_samples(samples: List[Dict], max_points: int = 120) -> List[Dict]:
+    """Downsample the time series to at most ``max_points`` by averaging consecutive buckets."""
+    if len(samples) <= max_points:
+        return list(samples)
+
+    bucket_size = math.ceil(len(samples) / max_points)
+    compacted = []
+    for i in range(0, len(samples), bucket_size):
+        bucket = samples[i : i + bucket_size]
+        averaged = {key: sum(s[key] for s in bucket) / len(bucket) for key in bucket[0]}
+        averaged["t"] = bucket[-1]["t"]
+        compacted.append({key: round(value, 2) for key, value in averaged.items()})
+    return compacted
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, math.ceil(percentile / 100 * len(ordered)) - 1)
+    return ordered[max(index, 0)]
+
+
+def _find_size(instance_type: str):
+    family, _, size = instance_type.partition(".")
+    sizes = INSTANCE_FAMILY_SIZES.get(family, [])
+    names = [s.name for s in sizes]
+    if size not in names:
+        return family, sizes, None
+    return family, sizes, names.index(size)
+
+
+def upsize_instance_type(instance_type: str, resource: str) -> Optional[str]:
+    """Return the nearest larger size in the same family that has more of ``resource``.
+
+    Args:
+        instance_type: EC2 instance type to upsize.
+        resource: Either ``"vcpus"`` or ``"memory_gib"``.
+
+    Returns:
+        The recommended instance type, or None if the size is unknown or already the largest.
+    """
+    family, sizes, index = _find_size(instance_type)
+    if index is None:
+        return None
+
+    current = getattr(sizes[index], resource)
+    for size in sizes[index + 1 :]:
+        if getattr(size, resource) > current:
+            return f"{family}.{size.name}"
+    return None
+
+
+def downsize_instance_type(instance_type: str) -> Optional[str]:
+    """Return the next smaller size in the same family, if it exists."""
+    family, sizes, index = _find_size(instance_type)
+    if not index:
+        return None
+    return f"{family}.{sizes[index - 1].name}"
+
+
+def gp2_baseline_iops(volume_size: int) -> int:
+    """Return the baseline IOPS of a gp2 volume of ``volume_size`` GB."""
+    return max(GP2_MIN_IOPS, GP2_IOPS_PER_GB * volume_size)
+
+
+def build_profile(
+    samples: List[Dict],
+    instance_type: str,
+    volume_size: int,
+    task_metadata: Dict,
+    max_points: int = 120,
+) -> Optional[ResourceProfile]:
+    """Build the right-sizing report for an electron from its sampled time series.
+
+    Args:
+        samples: Samples as produced by ``covalent_ec2_plugin.sampler``.
+        instance_type: EC2 instance type the electron ran on.
+        volume_size: Size in GB of the instance's root volume.
+        task_metadata: Metadata of the task, used to identify the electron.
+        max_points: Maximum number of samples kept in the report's time series.
+
+    Returns:
+        The resource profile, or None if no samples were collected.
+    """
+    if not samples:
+        return None
+
+    volume_size = int(volume_size)
+    cpu = [s["cpu_percent"] for s in samples]
+    iowait = [s["iowait_percent"] for s in samples]
+    memory = [100.0 * s["memory_used"] / s["memory_total"] for s in samples if s["memory_total"]]
+    disk = [100.0 * s["disk_used"] / s["disk_total"] for s in samples if s["disk_total"]]
+
+    cpu_core = [s.get("cpu_max_percent", s["cpu_percent"]) for s in samples]
+
+    cpu_mean = sum(cpu) / len(cpu)
+    cpu_p95 = _percentile(cpu, 95)
+    cpu_core_p95 = _percentile(cpu_core, 95)
+    iowait_mean = sum(iowait) / len(iowait)
+    memory_peak = max(memory, default=0.0)
+    disk_peak = max(disk, default=0.0)
+
+    reasons = []
+    recommended_instance_type = instance_type
+    recommended_volume_size = volume_size
+    if memory_peak >= MEMORY_BOUND_PERCENT:
+        bottleneck = "memory"
+        recommended_instance_type = upsize_instance_type(instance_type, "memory_gib")
+        reasons.append(f"Peak memory usage of {memory_peak:.0f}% is close to the instance limit.")
+    elif cpu_p95 >= CPU_BOUND_PERCENT:
+        bottleneck = "cpu"
+        recommended_instance_type = upsize_instance_type(instance_type, "vcpus")
+        reasons.append(f"95th percentile CPU usage of {cpu_p95:.0f}% saturates the vCPUs.")
+    elif cpu_core_p95 >= CPU_BOUND_PERCENT:
+        bottleneck = "cpu"
+        reasons.append(
+            f"A single vCPU was saturated ({cpu_core_p95:.0f}% at the 95th percentile) while "
+            f"overall CPU usage stayed at {cpu_p95:.0f}%, more vCPUs will not help unless "
+            "the task is parallelized."
+        )
+    elif iowait_mean >= IOWAIT_BOUND_PERCENT:
+        bottleneck = "io"
+        current_iops = gp2_baseline_iops(volume_size)
+        recommended_volume_size = math.ceil(2 * current_iops / GP2_IOPS_PER_GB)
+        reasons.append(
+            f"CPU spent {iowait_mean:.0f}% of the time waiting on I/O. gp2 baseline IOPS scale "
+            f"with volume size ({GP2_IOPS_PER_GB} IOPS per GB, minimum {GP2_MIN_IOPS}), a "
+            f"{recommended_volume_size} GB volume doubles the baseline from {current_iops} to "
+            f"{gp2_baseline_iops(recommended_volume_size)} IOPS."
+        )
+    elif cpu_core_p95 < CPU_IDLE_PERCENT and memory_peak < MEMORY_IDLE_PERCENT:
+        bottleneck = "idle"
+        recommended_instance_type = downsize_instance_type(instance_type)
+        reasons.append(
+            f"95th percentile usage of the busiest vCPU of {cpu_core_p95:.0f}% and peak memory "
+            f"usage of {memory_peak:.0f}% leave the instance mostly idle."
+        )
+    else:
+        bottleneck = "balanced"
+        reasons.append("Resource usage is within the expected range for the instance type.")
+
+    if recommended_instance_type is None:
+        recommended_instance_type = instance_type
+        direction = "smaller" if bottleneck == "idle" else "larger"
+        reasons.append(f"No {direction} size known for {instance_type}.")
+
+    if disk_peak >= DISK_FULL_PERCENT:
+        recommended_volume_size = max(recommended_volume_size, math.ceil(volume_size * 1.5))
+        reasons.append(f"Peak disk usage of {disk_peak:.0f}% is close to the volume size.")
+    elif bottleneck != "io" and disk_peak < DISK_EMPTY_PERCENT and volume_size > MIN_VOLUME_SIZE:
+        used_gb = max(s["disk_used"] for s in samples) / GIB
+        recommended_volume_size = max(MIN_VOLUME_SIZE, math.ceil(used_gb * 2))
+        reasons.append(f"Peak disk usage of {disk_peak:.0f}% leaves most of the volume unused.")
+
+    return ResourceProfile(
+        dispatch_id=task_metadata["dispatch_id"],
+        node_id=task_metadata["node_id"],
+        instance_type=instance_type,
+        volume_size=volume_size,
+        duration=samples[-1]["t"],
+        cpu_mean_percent=round(cpu_mean, 2),
+        cpu_p95_percent=round(cpu_p95, 2),
+        cpu_core_p95_percent=round(cpu_core_p95, 2),
+        iowait_mean_percent=round(iowait_mean, 2),
+        memory_peak_percent=round(memory_peak, 2),
+        disk_peak_percent=round(disk_peak, 2),
+        disk_read_peak_bps=max(s["disk_read_bps"] for s in samples),
+        disk_write_peak_bps=max(s["disk_write_bps"] for s in samples),
+        net_rx_peak_bps=max(s["net_rx_bps"] for s in samples),
+        net_tx_peak_bps=max(s["net_tx_bps"] for s in samples),
+        bottleneck=bottleneck,
+        recommended_instance_type=recommended_instance_type,
+        recommended_volume_size=recommended_volume_size,
+        reasons=reasons,
+        samples=compact_samples(samples, max_points),
+    )
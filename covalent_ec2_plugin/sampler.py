@@ -0,0 +1,197 @@
+# Copyright 2021 Agnostiq Inc.
+#
+# This file is part of Covalent.
+#
+# Licensed under the Apache License 2.0 (the "License"). A copy of the
+# License may be obtained with this software package or at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Use of this file is prohibited except in compliance with the License.
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Resource sampler run on the EC2 instance next to the remote function.
+
+This module is uploaded verbatim to the instance and executed as a script, so
+it must only depend on the standard library. It reads CPU, memory, disk and
+network counters from ``/proc`` at a fixed interval and appends one JSON line
+per sample to the output file until it is terminated.
+"""
+
+import argparse
+import json
+import os
+import signal
+import sys
+import time
+from typing import Dict, List, Tuple
+
+PROC_ROOT = "/proc"
+SECTOR_SIZE = 512
+VIRTUAL_DEVICE_PREFIXES = ("loop", "ram", "zram", "dm-", "md")
+
+
+def read_cpu_times(proc_root: str = PROC_ROOT) -> List[Tuple[int, int, int]]:
+    """Return the (total, idle, iowait) jiffies from ``/proc/stat``.
+
+    The first entry is the aggregate over all CPUs, followed by one entry per CPU.
+    """
+    times = []
+    with open(os.path.join(proc_root, "stat")) as f:
+        for line in f:
+            if not line.startswith("cpu"):
+                break
+            # guest and guest_nice are already accounted for in user and nice
+            fields = [int(v) for v in line.split()[1:9]]
+            iowait = fields[4] if len(fields) > 4 else 0
+            times.append((sum(fields), fields[3], iowait))
+    return times
+
+
+def read_memory(proc_root: str = PROC_ROOT) -> Tuple[int, int]:
+    """Return the (used, total) memory in bytes from ``/proc/meminfo``."""
+    info = {}
+    with open(os.path.join(proc_root, "meminfo")) as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            info[key] = int(value.split()[0]) * 1024
+    total = info["MemTotal"]
+    available = info.get("MemAvailable", info.get("MemFree", 0))
+    return total - available, total
+
+
+def read_disk_io(proc_root: str = PROC_ROOT) -> Tuple[int, int]:
+    """Return the cumulative (read, written) bytes of all whole block devices.
+
+    Partitions are recognised by their name extending the name of another listed device
+    (``xvda1``, ``nvme0n1p1``), and virtual devices layered on top of the disks are skipped
+    so that no I/O is counted twice.
+    """
+    with open(os.path.join(proc_root, "diskstats")) as f:
+        devices = {fields[2]: fields for fields in (line.split() for line in f)}
+
+    read_bytes = write_bytes = 0
+    for name, fields in devices.items():
+        if name.startswith(VIRTUAL_DEVICE_PREFIXES):
+            continue
+        if any(name != other and name.startswith(other) for other in devices):
+            continue
+        read_bytes += int(fields[5]) * SECTOR_SIZE
+        write_bytes += int(fields[9]) * SECTOR_SIZE
+    return read_bytes, write_bytes
+
+
+def read_net_io(proc_root: str = PROC_ROOT) -> Tuple[int, int]:
+    """Return the cumulative (received, transmitted) bytes of all non-loopback interfaces."""
+    rx_bytes = tx_bytes = 0
+    with open(os.path.join(proc_root, "net", "dev")) as f:
+        for line in f.readlines()[2:]:
+            name, _, counters = line.partition(":")
+            if name.strip() == "lo":
+                continue
+            fields = counters.split()
+            rx_bytes += int(fields[0])
+            tx_bytes += int(fields[8])
+    return rx_bytes, tx_bytes
+
+
+def read_disk_usage(path: str = "/") -> Tuple[int, int]:
+    """Return the (used, total) bytes of the filesystem containing ``path``."""
+    stat = os.statvfs(path)
+    total = stat.f_blocks * stat.f_frsize
+    return total - stat.f_bfree * stat.f_frsize, total
+
+
+def read_counters(proc_root: str = PROC_ROOT, disk_path: str = "/") -> Dict:
+    """Take a snapshot of all the counters needed to compute a sample."""
+    return {
+        "time": time.monotonic(),
+        "cpu": read_cpu_times(proc_root),
+        "memory": read_memory(proc_root),
+        "disk_usage": read_disk_usage(disk_path),
+        "disk_io": read_disk_io(proc_root),
+        "net_io": read_net_io(proc_root),
+    }
+
+
+def compute_sample(previous: Dict, current: Dict, start: float) -> Dict:
+    """Turn two consecutive counter snapshots into a sample of utilization and rates."""
+    elapsed = max(current["time"] - previous["time"], 1e-9)
+
+    def busy(before: Tuple[int, int, int], after: Tuple[int, int, int]) -> Tuple[float, float]:
+        total, idle, iowait = (a - b for a, b in zip(after, before))
+        if total <= 0:
+            return 0.0, 0.0
+        return 100.0 * (total - idle - iowait) / total, 100.0 * iowait / total
+
+    cpu_percent, iowait_percent = busy(previous["cpu"][0], current["cpu"][0])
+    per_cpu = [busy(b, a)[0] for b, a in zip(previous["cpu"][1:], current["cpu"][1:])]
+
+    def rate(key: str, index: int) -> float:
+        return max(current[key][index] - previous[key][index], 0) / elapsed
+
+    return {
+        "t": round(current["time"] - start, 3),
+        "cpu_percent": round(cpu_percent, 2),
+        "cpu_max_percent": round(max(per_cpu, default=cpu_percent), 2),
+        "iowait_percent": round(iowait_percent, 2),
+        "memory_used": current["memory"][0],
+        "memory_total": current["memory"][1],
+        "disk_used": current["disk_usage"][0],
+        "disk_total": current["disk_usage"][1],
+        "disk_read_bps": round(rate("disk_io", 0), 1),
+        "disk_write_bps": round(rate("disk_io", 1), 1),
+        "net_rx_bps": round(rate("net_io", 0), 1),
+        "net_tx_bps": round(rate("net_io", 1), 1),
+    }
+
+
+def sample(output: str, interval: float, proc_root: str = PROC_ROOT, disk_path: str = "/") -> None:
+    """Append a sample to ``output`` every ``interval`` seconds until terminated.
+
+    On SIGTERM a final sample covering the time since the last one is written before exiting,
+    so that any task which runs gets at least one sample.
+    """
+    previous = read_counters(proc_root, disk_path)
+    start = previous["time"]
+
+    with open(output, "a") as f:
+
+        def write_sample() -> None:
+            nonlocal previous
+            current = read_counters(proc_root, disk_path)
+            f.write(json.dumps(compute_sample(previous, current, start)) + "\n")
+            f.flush()
+            previous = current
+
+        def _terminate(signum, frame):
+            write_sample()
+            sys.exit(0)
+
+        signal.signal(signal.SIGTERM, _terminate)
+        while True:
+            time.sleep(interval)
+            # Keep SIGTERM from interleaving a final sample with a periodic one
+            signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGTERM})
+            write_sample()
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGTERM})
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--output", required=True, help="File the JSON line samples are appended to"
+    )
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between samples")
+    parser.add_argument("--disk-path", default="/", help="Path whose filesystem usage is sampled")
+    args = parser.parse_args(argv)
+
+    sample(args.output, args.interval, disk_path=args.disk_path)
+
+
+if __name__ == "__main__":
+    main()
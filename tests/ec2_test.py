@@ -16,18 +16,39 @@
 
 # Ignore results folders
 
+import asyncio
+import json
+import sys
 from pathlib import Path
+from types import SimpleNamespace
 from unittest import mock
 
 import covalent as ct
 import pytest
 
 from covalent_ec2_plugin import ec2
+from tests import requires_proc
 
 MOCK_USERNAME = "ubuntu"
 MOCK_PROFILE = "default"
 
 
+class LocalConnection:
+    """Stand-in for an SSH connection that runs the commands on the local machine."""
+
+    async def run(self, cmd: str, input: str = None):
+        proc = await asyncio.create_subprocess_shell(
+            cmd,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stdout, stderr = await proc.communicate(input.encode() if input else None)
+        return SimpleNamespace(
+            exit_status=proc.returncode, stdout=stdout.decode(), stderr=stderr.decode()
+        )
+
+
 @pytest.fixture
 def executor():
     config = {"username": MOCK_USERNAME, "profile": MOCK_PROFILE}
@@ -158,8 +179,134 @@ def test_upload_task():
     pass
 
 
-def test_submit_task():
-    pass
+@requires_proc
+@pytest.mark.asyncio
+async def test_submit_task_with_profiling(executor: ec2.EC2Executor, tmp_path: Path):
+    """Test that resources are sampled next to the task while it runs under synthetic load."""
+
+    remote_script_file = tmp_path / "script-123_1.py"
+    remote_script_file.write_text(
+        "import time\nend = time.time() + 1.5\nwhile time.time() < end:\n    pass\n"
+    )
+
+    executor.python_path = sys.executable
+    executor.conda_env = ""
+    executor.profile_resources = True
+    executor.profile_interval = 0.2
+
+    result = await executor.submit_task(LocalConnection(), str(remote_script_file))
+
+    assert result.exit_status == 0
+    assert len(executor.resource_samples) >= 3
+    assert max(s["cpu_percent"] for s in executor.resource_samples) > 0
+    assert not (tmp_path / "script-123_1_sampler.py").exists()
+    assert not (tmp_path / "script-123_1_resources.jsonl").exists()
+
+
+@pytest.mark.asyncio
+async def test_run_writes_resource_profile(executor: ec2.EC2Executor, mocker: mock, tmp_path):
+    """Test that the right-sizing report is written to the cache dir after the task runs."""
+
+    mock_task_metadata = {"dispatch_id": "123", "node_id": 1}
+    mock_sample = {
+        "t": 1.0,
+        "cpu_percent": 99.0,
+        "iowait_percent": 0.0,
+        "memory_used": 1,
+        "memory_total": 4,
+        "disk_used": 1,
+        "disk_total": 4,
+        "disk_read_bps": 0.0,
+        "disk_write_bps": 0.0,
+        "net_rx_bps": 0.0,
+        "net_tx_bps": 0.0,
+    }
+
+    async def mock_run(self, function, args, kwargs, task_metadata):
+        self.resource_samples = [mock_sample]
+        return "result"
+
+    mocker.patch("covalent_ec2_plugin.ec2.SSHExecutor.run", new=mock_run)
+
+    executor.cache_dir = str(tmp_path)
+    executor.profile_resources = True
+
+    assert await executor.run(lambda: None, [], {}, mock_task_metadata) == "result"
+
+    report = json.loads((tmp_path / "resource_profile_123_1.json").read_text())
+    assert report["bottleneck"] == "cpu"
+    assert report["recommended_instance_type"] == "t2.medium"
+    assert executor.resource_profile.samples == [mock_sample]
+
+
+def test_init_invalid_profile_interval():
+    with pytest.raises(ValueError):
+        ec2.EC2Executor(username=MOCK_USERNAME, profile=MOCK_PROFILE, profile_interval=0)
+
+
+@pytest.mark.asyncio
+async def test_run_profiling_errors_do_not_change_result(executor: ec2.EC2Executor, mocker: mock):
+    """Test that a failure writing the report is logged and the task's result is returned."""
+
+    async def mock_run(self, function, args, kwargs, task_metadata):
+        self.resource_samples = []
+        return "result"
+
+    mocker.patch("covalent_ec2_plugin.ec2.SSHExecutor.run", new=mock_run)
+    mocker.patch(
+        "covalent_ec2_plugin.ec2.EC2Executor._write_resource_profile",
+        side_effect=OSError("cache dir is read-only"),
+    )
+    app_log_mock = mocker.patch("covalent_ec2_plugin.ec2.app_log")
+
+    executor.profile_resources = True
+
+    assert await executor.run(lambda: None, [], {}, {"dispatch_id": "123", "node_id": 1}) == (
+        "result"
+    )
+    app_log_mock.warning.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_run_skips_profile_on_ssh_fail(executor: ec2.EC2Executor, mocker: mock):
+    """Test that no report is written when the task fell back to running locally."""
+
+    async def mock_run(self, function, args, kwargs, task_metadata):
+        self.resource_samples = []
+        return self._on_ssh_fail(function, args, kwargs, "Task exited with nonzero exit status 1.")
+
+    mocker.patch("covalent_ec2_plugin.ec2.SSHExecutor.run", new=mock_run)
+    mocker.patch("covalent_ec2_plugin.ec2.SSHExecutor._on_ssh_fail", return_value="local result")
+    write_profile_mock = mocker.patch(
+        "covalent_ec2_plugin.ec2.EC2Executor._write_resource_profile"
+    )
+
+    executor.profile_resources = True
+
+    assert await executor.run(lambda: None, [], {}, {"dispatch_id": "123", "node_id": 1}) == (
+        "local result"
+    )
+    write_profile_mock.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_submit_task_sampler_errors_do_not_change_result(
+    executor: ec2.EC2Executor, mocker: mock
+):
+    """Test that failing to collect the samples does not replace the task's output."""
+
+    mock_result = SimpleNamespace(exit_status=0, stdout="", stderr="")
+    mocker.patch("covalent_ec2_plugin.ec2.SSHExecutor.submit_task", return_value=mock_result)
+    mocker.patch("covalent_ec2_plugin.ec2.EC2Executor._start_sampler", return_value=True)
+    mocker.patch(
+        "covalent_ec2_plugin.ec2.EC2Executor._stop_sampler",
+        side_effect=ConnectionResetError("connection lost"),
+    )
+
+    executor.profile_resources = True
+
+    assert await executor.submit_task(mock.Mock(), "script.py") is mock_result
+    assert executor.resource_samples is None
 
 
 def test_get_status():
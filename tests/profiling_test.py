@@ -0,0 +1,265 @@
+# Copyright 2021 Agnostiq Inc.
+#
+# This file is part of Covalent.
+#
+# Licensed under the Apache License 2.0 (the "License"). A copy of the
+# License may be obtained with this software package or at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Use of this file is prohibited except in compliance with the License.
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the remote resource sampler and the right-sizing report."""
+
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from covalent_ec2_plugin import profiling, sampler
+from tests import requires_proc
+
+MOCK_TASK_METADATA = {"dispatch_id": "123", "node_id": 1}
+GB = 1024**3
+
+
+def make_sample(t=1.0, cpu=50.0, cpu_max=None, iowait=0.0, memory=0.5, disk=0.5, volume_gb=8):
+    return {
+        "t": t,
+        "cpu_percent": cpu,
+        "cpu_max_percent": cpu if cpu_max is None else cpu_max,
+        "iowait_percent": iowait,
+        "memory_used": int(memory * GB),
+        "memory_total": GB,
+        "disk_used": int(disk * volume_gb * GB),
+        "disk_total": volume_gb * GB,
+        "disk_read_bps": 0.0,
+        "disk_write_bps": 0.0,
+        "net_rx_bps": 0.0,
+        "net_tx_bps": 0.0,
+    }
+
+
+def test_read_cpu_times(tmp_path: Path):
+    """Test that guest time, already included in user and nice, is not counted twice."""
+
+    (tmp_path / "stat").write_text(
+        "cpu  100 0 100 700 100 0 0 0 50 0\n"
+        "cpu0 100 0 0 300 100 0 0 0 50 0\n"
+        "cpu1 0 0 100 400 0 0 0 0 0 0\n"
+        "intr 12345\n"
+    )
+
+    assert sampler.read_cpu_times(str(tmp_path)) == [
+        (1000, 700, 100),
+        (500, 300, 100),
+        (500, 400, 0),
+    ]
+
+
+def test_read_disk_io(tmp_path: Path):
+    """Test that partitions and virtual devices are not counted on top of their disks."""
+
+    def line(name, sectors_read, sectors_written):
+        return f"202 0 {name} 1 0 {sectors_read} 0 1 0 {sectors_written} 0 0 0 0\n"
+
+    (tmp_path / "diskstats").write_text(
+        line("loop0", 1000, 1000)
+        + line("xvda", 10, 20)
+        + line("xvda1", 10, 20)
+        + line("nvme0n1", 1, 2)
+        + line("nvme0n1p1", 1, 2)
+        + line("dm-0", 1000, 1000)
+    )
+
+    assert sampler.read_disk_io(str(tmp_path)) == (11 * 512, 22 * 512)
+
+
+def test_compute_sample():
+    """Test that counter deltas are turned into utilization percentages and rates."""
+
+    previous = {
+        "time": 10.0,
+        "cpu": [(1000, 600, 100), (500, 300, 50), (500, 300, 50)],
+        "memory": (1, 4),
+        "disk_usage": (1, 8),
+        "disk_io": (0, 0),
+        "net_io": (100, 200),
+    }
+    current = {
+        "time": 12.0,
+        "cpu": [(2000, 1100, 200), (1000, 350, 100), (1000, 750, 100)],
+        "memory": (2, 4),
+        "disk_usage": (2, 8),
+        "disk_io": (1000, 2000),
+        "net_io": (300, 600),
+    }
+
+    result = sampler.compute_sample(previous, current, start=10.0)
+
+    assert result["t"] == 2.0
+    assert result["cpu_percent"] == 40.0
+    assert result["cpu_max_percent"] == 80.0
+    assert result["iowait_percent"] == 10.0
+    assert result["memory_used"] == 2
+    assert result["disk_write_bps"] == 1000.0
+    assert result["net_rx_bps"] == 100.0
+
+
+@requires_proc
+def test_sampler_under_synthetic_load(tmp_path: Path):
+    """Test that the sampler script records the CPU load generated next to it."""
+
+    output = tmp_path / "resources.jsonl"
+    sampler_proc = subprocess.Popen(
+        [sys.executable, sampler.__file__, "--output", str(output), "--interval", "0.2"]
+    )
+    load_proc = subprocess.Popen([sys.executable, "-c", "while True: pass"])
+    try:
+        time.sleep(1.5)
+    finally:
+        load_proc.kill()
+        sampler_proc.terminate()
+        sampler_proc.wait(timeout=5)
+
+    samples = profiling.parse_samples(output.read_text())
+
+    assert sampler_proc.returncode == 0
+    assert len(samples) >= 3
+    assert max(s["cpu_percent"] for s in samples) > 0
+    assert all(0 < s["memory_used"] < s["memory_total"] for s in samples)
+    assert all(0 < s["disk_used"] <= s["disk_total"] for s in samples)
+
+
+@requires_proc
+def test_sampler_writes_final_sample_on_terminate(tmp_path: Path):
+    """Test that a sampler terminated before its first interval still records a sample."""
+
+    output = tmp_path / "resources.jsonl"
+    sampler_proc = subprocess.Popen(
+        [sys.executable, sampler.__file__, "--output", str(output), "--interval", "60"]
+    )
+    # Wait for the sampler to open its output, i.e. to have installed its SIGTERM handler
+    deadline = time.monotonic() + 10
+    while not output.exists() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    time.sleep(0.2)
+
+    sampler_proc.terminate()
+    sampler_proc.wait(timeout=5)
+
+    samples = profiling.parse_samples(output.read_text())
+
+    assert sampler_proc.returncode == 0
+    assert len(samples) == 1
+    assert samples[0]["memory_total"] > 0
+
+
+def test_parse_samples_skips_truncated_lines():
+    raw = json.dumps(make_sample()) + "\n" + '{"t": 2.0, "cpu_'
+
+    assert profiling.parse_samples(raw) == [make_sample()]
+
+
+def test_compact_samples():
+    samples = [make_sample(t=float(i), cpu=float(i % 2) * 100) for i in range(10)]
+
+    compacted = profiling.compact_samples(samples, max_points=5)
+
+    assert len(compacted) == 5
+    assert [s["t"] for s in compacted] == [1.0, 3.0, 5.0, 7.0, 9.0]
+    assert all(s["cpu_percent"] == 50.0 for s in compacted)
+    assert profiling.compact_samples(samples, max_points=20) == samples
+
+
+@pytest.mark.parametrize(
+    "instance_type, resource, expected",
+    [
+        ("t2.micro", "vcpus", "t2.medium"),
+        ("t2.micro", "memory_gib", "t2.small"),
+        ("t3.micro", "vcpus", "t3.xlarge"),
+        ("m5.large", "vcpus", "m5.xlarge"),
+        ("t2.2xlarge", "vcpus", None),
+        ("x1e.xlarge", "vcpus", None),
+    ],
+)
+def test_upsize_instance_type(instance_type, resource, expected):
+    assert profiling.upsize_instance_type(instance_type, resource) == expected
+
+
+@pytest.mark.parametrize(
+    "instance_type, expected",
+    [
+        ("t2.micro", "t2.nano"),
+        ("t2.nano", None),
+        ("m5.xlarge", "m5.large"),
+        ("x1e.xlarge", None),
+    ],
+)
+def test_downsize_instance_type(instance_type, expected):
+    assert profiling.downsize_instance_type(instance_type) == expected
+
+
+@pytest.mark.parametrize(
+    "sample_kwargs, bottleneck, instance_type, volume_size",
+    [
+        ({"cpu": 98.0}, "cpu", "t2.medium", 8),
+        ({"cpu": 50.0, "cpu_max": 100.0}, "cpu", "t2.micro", 8),
+        ({"memory": 0.95}, "memory", "t2.small", 8),
+        ({"cpu": 10.0, "iowait": 60.0}, "io", "t2.micro", 67),
+        ({"cpu": 5.0, "memory": 0.2}, "idle", "t2.nano", 8),
+        ({"cpu": 50.0, "memory": 0.5}, "balanced", "t2.micro", 8),
+    ],
+)
+def test_build_profile_recommendation(sample_kwargs, bottleneck, instance_type, volume_size):
+    """Test that the bottleneck is classified and the spec resized accordingly."""
+
+    samples = [make_sample(t=float(i), **sample_kwargs) for i in range(1, 6)]
+
+    profile = profiling.build_profile(samples, "t2.micro", 8, MOCK_TASK_METADATA)
+
+    assert profile.bottleneck == bottleneck
+    assert profile.recommended_instance_type == instance_type
+    assert profile.recommended_volume_size == volume_size
+    assert profile.dispatch_id == "123"
+    assert profile.duration == 5.0
+    assert profile.samples == samples
+    assert json.loads(profile.to_json())["bottleneck"] == bottleneck
+
+
+def test_build_profile_unknown_instance_type():
+    samples = [make_sample(cpu=98.0)]
+
+    profile = profiling.build_profile(samples, "x1e.xlarge", 8, MOCK_TASK_METADATA)
+
+    assert profile.recommended_instance_type == "x1e.xlarge"
+    assert "No larger size known for x1e.xlarge." in profile.reasons
+
+
+@pytest.mark.parametrize(
+    "volume_size, disk, expected",
+    [
+        (8, 0.9, 12),
+        (8, 0.1, 8),
+        (100, 0.05, 10),
+        (20, 0.5, 20),
+    ],
+)
+def test_build_profile_volume_size(volume_size, disk, expected):
+    samples = [make_sample(disk=disk, volume_gb=volume_size)]
+
+    profile = profiling.build_profile(samples, "t2.micro", str(volume_size), MOCK_TASK_METADATA)
+
+    assert profile.recommended_volume_size == expected
+
+
+def test_build_profile_without_samples():
+    assert profiling.build_profile([], "t2.micro", 8, MOCK_TASK_METADATA) is None